@@ -8,7 +8,8 @@ onto a grid), and weights. The MapMaker class can then use this TOD object to pe
 import logging
 import os
 from dataclasses import dataclass, field
-from typing import Dict, Optional, Sequence
+from types import MappingProxyType
+from typing import Mapping, Optional, Sequence
 
 import astropy.units as u
 import healpy as hp
@@ -16,6 +17,21 @@ import npipe_utils as utils
 import numpy as np
 from astropy.io import ascii, fits
 
+# Nominal Planck frequency channels, in GHz. Immutable, since it is shared by every
+# config and MapMaker that uses the defaults.
+_PLANCK_FREQ = MappingProxyType(
+    {"LFI": (30, 40, 70), "HFI": (100, 143, 217, 353, 545, 857)}
+)
+# Default background flux for background subtraction, in K_CMB units. Read-only,
+# since the same arrays are handed to every config that uses the defaults.
+_DEFAULT_F_BG = {
+    "LFI": np.array([1.70065975e-03, 1.54363888e-03, 2.03856413e-04]),
+    "HFI": np.array([9.50687754e-5, 1.89320788e-4, 6.29073416e-4, 6.16040430e-3]),
+}
+for _f_bg in _DEFAULT_F_BG.values():
+    _f_bg.setflags(write=False)
+del _f_bg
+
 
 @dataclass
 class GetTODConfig:
@@ -46,8 +62,8 @@ class GetTODConfig:
         Whether to perform background subtraction using `f_bg`. Default is False.
     nside: Optional[int]
         Nside parameter for HEALPix pixelization.
-    planck_freq: Dict[str, Sequence[int]]
-        Dictionary mapping instruments to their available frequency channels. Default is {"LFI": [30, 40, 70], "HFI": [100, 143, 217, 353, 545, 857]}.
+    planck_freq: Mapping[str, Sequence[int]]
+        Mapping of instruments to their available frequency channels. Default is {"LFI": (30, 40, 70), "HFI": (100, 143, 217, 353, 545, 857)}.
 
     Returns
     -----------
@@ -66,11 +82,8 @@ class GetTODConfig:
     f_bg: Optional[np.ndarray] = None
     bg_subtraction: bool = False
     nside: Optional[int] = None
-    planck_freq: Dict[str, Sequence[int]] = field(
-        default_factory=lambda: {
-            "LFI": [30, 40, 70],
-            "HFI": [100, 143, 217, 353, 545, 857],
-        }
+    planck_freq: Mapping[str, Sequence[int]] = field(
+        default_factory=lambda: _PLANCK_FREQ
     )
 
     def __post_init__(self):
@@ -84,8 +97,8 @@ class GetTODConfig:
 
     def _default_bg(self) -> np.ndarray:
         if self.instrument == "LFI":
-            return np.array([1.70065975e-03, 1.54363888e-03, 2.03856413e-04])
-        return np.array([9.50687754e-5, 1.89320788e-4, 6.29073416e-4, 6.16040430e-3])
+            return _DEFAULT_F_BG["LFI"]
+        return _DEFAULT_F_BG["HFI"]
 
 
 @dataclass
@@ -97,6 +110,13 @@ class TOD:
     phi: Optional[np.ndarray] = None
     nside: Optional[int] = None
 
+    def __post_init__(self):
+        # Pin the dtypes and layout the binning code expects, so the mapmaker never
+        # has to make upcast or contiguous copies of the full TOD.
+        self.signal = np.ascontiguousarray(self.signal, dtype=np.float32)
+        self.pixels = np.ascontiguousarray(self.pixels, dtype=np.int64)
+        self.weights = np.ascontiguousarray(self.weights, dtype=np.float32)
+
 
 class Get_TOD:
     def __init__(self, config: Optional[GetTODConfig] = None, **kwargs):
@@ -297,10 +317,16 @@ provide a valid path to the folder containing destriped Planck TOD files."
         return x, y, xbinning, ybinning, signal, pixweights
 
     # Public wrappers
-    def tod(self, freq: Optional[int] = None, nside: Optional[int] = None) -> TOD:
+    def tod(
+        self,
+        freq: Optional[int] = None,
+        nside: Optional[int] = None,
+        split: Optional[str] = None,
+    ) -> TOD:
         """Load TOD for given frequency and nside and return a `TOD` object.
 
         Defaults to configuration values when arguments are not provided.
+        `split` ('A' or 'B') selects one NPIPE half of the focal plane.
         """
         freq = freq or self.freq
         nside = nside or self.config.nside
@@ -308,7 +334,7 @@ provide a valid path to the folder containing destriped Planck TOD files."
             raise ValueError(
                 "nside must be provided either in config or as an argument"
             )
-        signal, pixels, pixweights = self._get_tod(freq, nside)
+        signal, pixels, pixweights = self._get_tod(freq, nside, split=split)
         return TOD(signal=signal, pixels=pixels, weights=pixweights, nside=nside)
 
     def tod_withcc(
@@ -346,6 +372,7 @@ provide a valid path to the folder containing destriped Planck TOD files."
         npix: int = 80,
         pixsize: float = 1.5,
         coord_system: Optional[str] = None,
+        split: Optional[str] = None,
     ):
         """Project TOD onto a square grid around `coord`.
         Only use this for small fields where flat projection
@@ -357,5 +384,5 @@ provide a valid path to the folder containing destriped Planck TOD files."
         freq = freq or self.freq
         coord_system = coord_system or self.coord_system
         return self._get_tod_ongrid(
-            coord, freq, npix, pixsize, coord_system=coord_system
+            coord, freq, npix, pixsize, coord_system=coord_system, split=split
         )
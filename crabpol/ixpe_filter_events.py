@@ -7,10 +7,43 @@ to get the effective area and modulation factor for the filtered events. The fil
 are then saved to a new fits file in the specified data directory.
 """
 
+import hashlib
+import os
+
 import ixpe_instrument as instrument
 import numpy as np
 from astropy.io import fits
 
+# Column layout of the filtered events table (FITS formats J, E, E, E, D, D, E, E, E)
+_FILTERED_EVENTS_DTYPE = np.dtype(
+    [
+        ("PI", "i4"),
+        ("E", "f4"),
+        ("X", "f4"),
+        ("Y", "f4"),
+        ("Q", "f8"),
+        ("U", "f8"),
+        ("W_MOM", "f4"),
+        ("Aeff", "f4"),
+        ("Modf", "f4"),
+    ]
+)
+_OUTPUT_FORMATS = ("fits", "parquet")
+# Header keyword (FITS) / schema metadata key (Parquet) holding the input fingerprint
+_FINGERPRINT_KEY = "FILTKEY"
+
+
+def _import_pyarrow():
+    try:
+        import pyarrow as pa
+        import pyarrow.parquet as pq
+    except ImportError as err:
+        raise ImportError(
+            "Reading or writing filtered events as Parquet requires pyarrow. Install it "
+            "with `pip install pyarrow` or use output_format='fits'."
+        ) from err
+    return pa, pq
+
 
 class FilterEvents:
     """
@@ -34,10 +67,16 @@ class FilterEvents:
         The minimum energy (in keV) for filtering the events.
     max_energy: float
         The maximum energy (in keV) for filtering the events.
+    output_format: str
+        Format of the filtered events file, 'fits' (default) or 'parquet'. Parquet output is
+        columnar and zstd-compressed, which makes repeated reads of a few columns cheaper;
+        it requires pyarrow.
         Methods:
         --------
         filter_events():
-            Filters the events based on the specified energy range and saves the filtered events to a new fits file in the specified data directory.
+            Filters the events based on the specified energy range and saves the filtered events to a new fits (or parquet) file in the specified data directory.
+            The output stores a fingerprint of the events file and filter settings; if an existing
+            output file matches it, the filtering is skipped.
     """
 
     def __init__(
@@ -50,7 +89,17 @@ class FilterEvents:
         recon_version="alpha075_02",
         min_energy=2.0,
         max_energy=8.0,
+        output_format="fits",
     ):
+        if output_format not in _OUTPUT_FORMATS:
+            raise ValueError(
+                "output_format must be one of {}, got '{}'".format(
+                    _OUTPUT_FORMATS, output_format
+                )
+            )
+        if output_format == "parquet":
+            # fail before reading any events rather than at the final write
+            _import_pyarrow()
         self.events_path = events_path
         self.resp_path = resp_path
         self.data_dir = data_dir
@@ -59,66 +108,131 @@ class FilterEvents:
         self.recon_version = recon_version
         self.min_energy = min_energy
         self.max_energy = max_energy
+        self.output_format = output_format
 
     def filter_events(self):
-        hdul = fits.open(self.events_path)
-        PI = hdul[1].data["PI"]
-        Q = hdul[1].data["Q"]
-        U = hdul[1].data["U"]
-        X = hdul[1].data["X"]
-        Y = hdul[1].data["Y"]
-        wmom = hdul[1].data["W_MOM"]
-        hdul.close()
-
-        es = instrument.chan_to_e(
-            PI,
-            resp_path=self.resp_path,
-            detector=self.detector,
-            caldb_version=self.caldb_version,
-            recon_version=self.recon_version,
+        out_path = self.data_dir + "/filtered_{}_{}.{}".format(
+            self.detector, self.recon_version, self.output_format
         )
-        aeff = instrument.e_to_aeff(
-            es,
+        fingerprint = self._fingerprint()
+        if self._stored_fingerprint(out_path) == fingerprint:
+            print(
+                "Filtered events file {} is up to date with the inputs, skipping".format(
+                    out_path
+                )
+            )
+            return
+
+        # Memory-map the event table so only the columns read here, and only the
+        # events passing the energy cut, are copied into memory.
+        with fits.open(self.events_path, memmap=True) as hdul:
+            events = hdul[1].data
+            PI = events.field("PI")
+            es = instrument.chan_to_e(
+                PI,
+                resp_path=self.resp_path,
+                detector=self.detector,
+                caldb_version=self.caldb_version,
+                recon_version=self.recon_version,
+            )
+            mask = es >= self.min_energy
+            mask &= es <= self.max_energy
+            idx = np.flatnonzero(mask)
+            energy = es[idx]
+            PImasked = PI[idx]
+            qmasked = events.field("Q")[idx]
+            umasked = events.field("U")[idx]
+            xmasked = events.field("X")[idx]
+            ymasked = events.field("Y")[idx]
+            wmommasked = events.field("W_MOM")[idx]
+
+        # Response lookups are only needed for the events that pass the cut
+        eff = instrument.e_to_aeff(
+            energy,
             resp_path=self.resp_path,
             detector=self.detector,
             caldb_version=self.caldb_version,
             recon_version=self.recon_version,
         )
-        modf = instrument.e_to_modf(
-            es,
+        mod = instrument.e_to_modf(
+            energy,
             resp_path=self.resp_path,
             detector=self.detector,
             caldb_version=self.caldb_version,
             recon_version=self.recon_version,
         )
-        es = np.array(es)
-        aeff = np.array(aeff)
-        modf = np.array(modf)
-
-        mask = np.logical_and(es >= self.min_energy, es <= self.max_energy)
-        energy = es[mask]
-        eff = aeff[mask[:, 0]]
-        mod = modf[mask[:, 0]]
-        qmasked = Q[mask[:, 0]]
-        umasked = U[mask[:, 0]]
-        xmasked = X[mask[:, 0]]
-        ymasked = Y[mask[:, 0]]
-        wmommasked = wmom[mask[:, 0]]
-        PImasked = PI[mask[:, 0]]
-
-        c1 = fits.Column(name="PI", array=PImasked, format="J")
-        c2 = fits.Column(name="E", array=energy, format="E")
-        c3 = fits.Column(name="X", array=xmasked, format="E")
-        c4 = fits.Column(name="Y", array=ymasked, format="E")
-        c5 = fits.Column(name="Q", array=qmasked, format="D")
-        c6 = fits.Column(name="U", array=umasked, format="D")
-        c7 = fits.Column(name="W_MOM", array=wmommasked, format="E")
-        c8 = fits.Column(name="Aeff", array=eff, format="E")
-        c9 = fits.Column(name="Modf", array=mod, format="E")
-        cols = fits.ColDefs([c1, c2, c3, c4, c5, c6, c7, c8, c9])
-        hdu = fits.BinTableHDU.from_columns(cols)
-        hdu.writeto(
-            self.data_dir
-            + "/filtered_{}_{}.fits".format(self.detector, self.recon_version),
-            overwrite=True,
+
+        columns = {
+            "PI": PImasked,
+            "E": energy,
+            "X": xmasked,
+            "Y": ymasked,
+            "Q": qmasked,
+            "U": umasked,
+            "W_MOM": wmommasked,
+            "Aeff": eff,
+            "Modf": mod,
+        }
+        if self.output_format == "parquet":
+            self._write_parquet(columns, out_path, fingerprint)
+        else:
+            self._write_fits(columns, out_path, fingerprint)
+
+    def _fingerprint(self):
+        """Hash the events file (path and modification time) and the CalDB tree together with the filter settings."""
+        key = "|".join(
+            str(v)
+            for v in (
+                os.path.abspath(self.events_path),
+                os.path.getmtime(self.events_path),
+                os.path.abspath(self.resp_path),
+                self.min_energy,
+                self.max_energy,
+                self.detector,
+                self.caldb_version,
+                self.recon_version,
+            )
+        )
+        return hashlib.sha1(key.encode()).hexdigest()
+
+    def _stored_fingerprint(self, out_path):
+        """Return the fingerprint stored in an existing output file, or None."""
+        if not os.path.exists(out_path):
+            return None
+        if self.output_format == "parquet":
+            pa, pq = _import_pyarrow()
+            try:
+                metadata = pq.read_schema(out_path).metadata or {}
+            except (OSError, pa.ArrowInvalid):
+                # unreadable or truncated file: filter again
+                return None
+            stored = metadata.get(_FINGERPRINT_KEY.encode())
+            return stored.decode() if stored is not None else None
+        try:
+            return fits.getval(out_path, _FINGERPRINT_KEY, ext=1)
+        except (OSError, KeyError, IndexError):
+            return None
+
+    @staticmethod
+    def _write_fits(columns, out_path, fingerprint):
+        rec = np.empty(len(columns["PI"]), dtype=_FILTERED_EVENTS_DTYPE)
+        for name in _FILTERED_EVENTS_DTYPE.names:
+            rec[name] = columns[name]
+        hdu = fits.BinTableHDU(data=rec)
+        hdu.header[_FINGERPRINT_KEY] = (
+            fingerprint,
+            "input fingerprint",
+        )
+        hdu.writeto(out_path, overwrite=True, checksum=True)
+
+    @staticmethod
+    def _write_parquet(columns, out_path, fingerprint):
+        pa, pq = _import_pyarrow()
+        table = pa.table(
+            {
+                name: np.asarray(columns[name], dtype=_FILTERED_EVENTS_DTYPE[name])
+                for name in _FILTERED_EVENTS_DTYPE.names
+            }
         )
+        table = table.replace_schema_metadata({_FINGERPRINT_KEY: fingerprint})
+        pq.write_table(table, out_path, compression="zstd")
@@ -5,12 +5,92 @@ This module contains functions to
 factor for a given energy
 """
 
+import functools
 import os
 
 import numpy as np
 from astropy.io import fits
 
 
+def _sorted_read_only(grid, values, grid_dtype):
+    """Return read-only copies of a lookup grid and its tabulated values, in ascending grid order.
+
+    The copies are safe to share via the caches. Grids that a CalDB file does not store in
+    ascending order are sorted once here, so the searchsorted lookups stay valid.
+    """
+    grid = np.array(grid, dtype=grid_dtype)
+    values = np.array(values, dtype=np.float32)
+    if np.any(grid[1:] < grid[:-1]):
+        order = np.argsort(grid, kind="stable")
+        grid, values = grid[order], values[order]
+    grid.setflags(write=False)
+    values.setflags(write=False)
+    return grid, values
+
+
+@functools.lru_cache(maxsize=32)
+def _load_rmf(resp_path, detector, caldb_version, recon_version):
+    """Read the channel grid and channel energy bin centres from the CalDB response matrix file.
+
+    Also returns whether the channels form the dense 0..N-1 index that IXPE RMFs use,
+    in which case a PI value can index the bin centres directly.
+    """
+    rmf_path = os.path.join(
+        resp_path,
+        "data/ixpe/gpd/cpf/rmf/ixpe_{}_{}_{}.rmf".format(
+            detector, caldb_version, recon_version
+        ),
+    )
+    with fits.open(rmf_path, memmap=False) as hdul:
+        data = hdul[2].data
+        chan, echan = _sorted_read_only(
+            data["CHANNEL"], 0.5 * (data["E_MIN"] + data["E_MAX"]), np.int64
+        )
+    is_dense = bool(np.array_equal(chan, np.arange(len(chan))))
+    return chan, echan, is_dense
+
+
+def _read_specresp(path):
+    """Read the lower energy bin edges and SPECRESP column from an ARF-like CalDB file."""
+    with fits.open(path, memmap=False) as hdul:
+        data = hdul[1].data
+        return _sorted_read_only(data["ENERG_LO"], data["SPECRESP"], np.float32)
+
+
+def _lookup_energy_bin(E_low, values, energy):
+    """Return the tabulated value of the energy bin containing each energy.
+
+    Bins are located with a binary search on the sorted lower bin edges; energies
+    outside the tabulated range take the value of the nearest bin.
+    """
+    idx = np.searchsorted(E_low, np.asarray(energy), side="right") - 1
+    return values[np.clip(idx, 0, len(values) - 1)]
+
+
+@functools.lru_cache(maxsize=32)
+def _load_arf(resp_path, detector, caldb_version, recon_version):
+    """Read the effective area table from the CalDB ancillary response file."""
+    arf_path = os.path.join(
+        resp_path,
+        "data/ixpe/gpd/cpf/arf/ixpe_{}_{}_{}.arf".format(
+            detector, caldb_version, recon_version
+        ),
+    )
+    return _read_specresp(arf_path)
+
+
+@functools.lru_cache(maxsize=32)
+def _load_modf(resp_path, detector, caldb_version, recon_version):
+    """Read the modulation factor table from the CalDB modulation factor file."""
+    modf_path = os.path.join(
+        resp_path,
+        "data/ixpe/gpd/cpf/modfact/ixpe_{}_{}_mfact_{}.fits".format(
+            detector, caldb_version, recon_version
+        ),
+    )
+    return _read_specresp(modf_path)
+
+
 def chan_to_e(
     channel,
     resp_path,
@@ -35,28 +115,25 @@ def chan_to_e(
         associated with the event reconstruction method used (eg. 'alpha075_02').
     Returns:
     --------
-    energy: float or list of floats
-        The incident photon energy corresponding to the input PI channel(s).
+    energy: float or ndarray
+        The incident photon energy (bin centre of the matching channel) corresponding
+        to the input PI channel(s).
     """
-    rmf_path = os.path.join(
-        resp_path,
-        "/data/ixpe/gpd/cpf/rmf/ixpe_{}_{}_{}.rmf".format(
-            detector, caldb_version, recon_version
-        ),
-    )
-    hdul = fits.open(rmf_path)
-    emin = hdul[2].data["E_MIN"]
-    emax = hdul[2].data["E_MAX"]
-    chan = hdul[2].data["CHANNEL"]
-    echan = (emin + emax) / 2.0
-    if len(channel) > 0:
-        e = []
-        for i in channel:
-            (k,) = np.where(chan == i)
-            e.append(echan[k])
-        return e
+    chan, echan, is_dense = _load_rmf(resp_path, detector, caldb_version, recon_version)
+    channel = np.asarray(channel)
+    if is_dense:
+        idx = channel
+        known = (channel >= 0) & (channel < len(chan))
     else:
-        return echan[chan == channel]
+        idx = np.minimum(np.searchsorted(chan, channel), len(chan) - 1)
+        known = chan[idx] == channel
+    if not np.all(known):
+        raise ValueError(
+            "PI channel(s) {} not found in the response matrix file".format(
+                np.unique(channel[~known])
+            )
+        )
+    return echan[idx]
 
 
 def e_to_aeff(
@@ -82,29 +159,11 @@ def e_to_aeff(
         The reconstruction version refers to the response matrix associated with the event reconstruction method used (eg. 'alpha075_02').
     Returns:
     --------
-    aeff: float or list of floats
-        The effective area (or spectral response) corresponding to the input energy(ies).
+    aeff: float or ndarray
+        The effective area (or spectral response) of the energy bin containing the input energy(ies).
     """
-    arf_path = os.path.join(
-        resp_path,
-        "/data/ixpe/gpd/cpf/arf/ixpe_{}_{}_{}.arf".format(
-            detector, caldb_version, recon_version
-        ),
-    )
-    hdul = fits.open(arf_path)
-    E_low = hdul[1].data["ENERG_LO"]
-    E_High = hdul[1].data["ENERG_HI"]
-    aeff = hdul[1].data["SPECRESP"]
-    hdul.close()
-    echan = (E_low + E_High) / 2.0
-    if len(energy) > 0:
-        af = []
-        for i in energy:
-            (k,) = np.where(echan == i)
-            af.append(aeff[k])
-        return af
-    else:
-        return aeff[echan == energy]
+    E_low, aeff = _load_arf(resp_path, detector, caldb_version, recon_version)
+    return _lookup_energy_bin(E_low, aeff, energy)
 
 
 def e_to_modf(
@@ -130,26 +189,8 @@ def e_to_modf(
         The reconstruction version refers to the response matrix associated with the event reconstruction method used (eg. 'alpha075_02').
     Returns:
     --------
-    modf: float or list of floats
-        The modulation factor corresponding to the input energy(ies).
+    modf: float or ndarray
+        The modulation factor of the energy bin containing the input energy(ies).
     """
-    modf_path = os.path.join(
-        resp_path,
-        "/data/ixpe/gpd/cpf/modfact/ixpe_{}_{}_mfact_{}.fits".format(
-            detector, caldb_version, recon_version
-        ),
-    )
-    hdul = fits.open(modf_path)
-    E_low = hdul[1].data["ENERG_LO"]
-    E_High = hdul[1].data["ENERG_HI"]
-    modf = hdul[1].data["SPECRESP"]
-    hdul.close()
-    echan = (E_low + E_High) / 2.0
-    if len(energy) > 0:
-        mf = []
-        for i in energy:
-            (k,) = np.where(echan == i)
-            mf.append(modf[k])
-        return mf
-    else:
-        return modf[echan == energy]
+    E_low, modf = _load_modf(resp_path, detector, caldb_version, recon_version)
+    return _lookup_energy_bin(E_low, modf, energy)
@@ -12,33 +12,41 @@ from astropy.io import fits
 from astropy.wcs import WCS
 from matplotlib import pyplot as plt
 
+_HALF_RAD2DEG = 90.0 / np.pi
 
-def pol_degree(maps):
-    """Calculate the polarization degree from the Stokes parameter maps."""
-    mapps = maps.copy()
-    q = mapps[1]
-    u = mapps[2]
-    np.divide(mapps[1], mapps[0], out=q, where=mapps[0] != 0)
-    np.divide(mapps[2], mapps[0], out=u, where=mapps[0] != 0)
-    p = np.sqrt(q**2 + u**2)
-    return p
 
+def _norm_qu(stokes_i, stokes_q, stokes_u):
+    """Normalise Q and U by I, leaving Q and U unchanged in pixels where I is zero."""
+    safe_i = np.where(stokes_i != 0, stokes_i, 1.0)
+    return stokes_q / safe_i, stokes_u / safe_i
 
-def normQU_to_qu(maps):
-    """Calculate the normalized Stokes parameters q and u from the Stokes parameter maps."""
-    mapps = maps.copy()
-    q = mapps[1]
-    u = mapps[2]
-    np.divide(mapps[1], mapps[0], out=q, where=mapps[0] != 0)
-    np.divide(mapps[2], mapps[0], out=u, where=mapps[0] != 0)
-    return q, u
+
+def _stokes_iqu(maps, dtype):
+    """Return the I, Q and U maps as C-contiguous arrays of the requested dtype."""
+    return (np.asarray(maps[k], dtype=dtype, order="C") for k in range(3))
+
+
+def pol_degree(maps, dtype=np.float32):
+    """Calculate the polarization degree from the Stokes parameter maps.
+    The maps are cast to dtype (float32 by default, halving memory traffic); use dtype=None to keep the input precision.
+    """
+    q, u = _norm_qu(*_stokes_iqu(maps, dtype))
+    # q is a fresh buffer from _norm_qu, so the result can overwrite it
+    return np.hypot(q, u, out=q)
+
+
+def normQU_to_qu(maps, dtype=np.float32):
+    """Calculate the normalized Stokes parameters q and u from the Stokes parameter maps.
+    The maps are cast to dtype (float32 by default); use dtype=None to keep the input precision.
+    """
+    return _norm_qu(*_stokes_iqu(maps, dtype))
 
 
 def position_angle_pol(q, u, deg=True):
     """Calculate the position angle of polarization from the Stokes parameters q and u. Select deg=True to return the angle in degrees, or deg=False to return the angle in radians."""
-    a = 0.5 * np.arctan2(u, q)
-    if deg:
-        a = np.rad2deg(a)
+    a = np.arctan2(u, q)
+    # scale in place: the half-angle and the degree conversion are one multiply
+    a *= _HALF_RAD2DEG if deg else 0.5
     return a
 
 
@@ -54,15 +62,11 @@ def posanglepol_to_xy(pol_degree, pol_angle, deg=False):
 
 def int_area(data, center, num_pix, extent=20, pixel_size=0.00072):
     """Calculate the total flux over a circular area from central pixel of the map. The radius of the circular area is determined by the extent and pixel size parameters."""
-    x, y = np.indices((num_pix, num_pix))
-    r = np.sqrt((x - center[0]) ** 2 + (y - center[1]) ** 2)
-    r = r * pixel_size
-    R = extent * pixel_size
+    # Compare squared radii in pixel units: pixel_size scales both sides equally
+    x, y = np.ogrid[:num_pix, :num_pix]
+    r2 = (x - center[0]) ** 2 + (y - center[1]) ** 2
     maparea = np.copy(data)
-    for i in np.arange(num_pix):
-        for j in np.arange(num_pix):
-            if r[i, j] > R:
-                maparea[:, i, j] = 0.0
+    maparea[:, r2 > extent**2] = 0.0
     return maparea
 
 
@@ -78,7 +82,7 @@ def sum_area(region):
     elif I != 0:
         q = Q / I
         u = U / I
-    p = np.sqrt(q**2 + u**2)
+    p = np.hypot(q, u)
     a = position_angle_pol(q, u, deg=True)
     return p, a
 
@@ -151,14 +155,20 @@ def iram_wcs(
 def calculate_sky_grid(side, pixel_size, ra, dec):
     """Calculate the sky coordinates (RA, Dec) for a grid of pixels based on the side length of the map, pixel size, and central coordinates (ra, dec). The function generates a WCS object using the gen_wcs function and then uses it to convert pixel coordinates to sky coordinates."""
     wcs_grid = gen_wcs(side, pixel_size, ra, dec)
-    xx0, xx1 = (-0.5, side - 0.5)
-    yy0, yy1 = (-0.5, side - 0.5)
-    nx, ny = [side, side]
-    X, Y = np.meshgrid(
-        np.linspace(xx0, xx1, nx, endpoint=True),
-        np.linspace(yy0, yy1, ny, endpoint=True),
-    )
-    ra, dec = wcs_grid.wcs_pix2world(X, Y, 0)
+    pix = np.linspace(-0.5, side - 0.5, side, endpoint=True)
+    pc = wcs_grid.wcs.get_pc()
+    if wcs_grid.has_celestial or pc[0, 1] != 0 or pc[1, 0] != 0:
+        # Projected or rotated WCS: every pixel has to be transformed
+        X, Y = np.meshgrid(pix, pix)
+        ra, dec = wcs_grid.wcs_pix2world(X, Y, 0)
+        return ra, dec
+    # Linear, axis-aligned WCS (as built by gen_wcs): RA only depends on the column
+    # and Dec only on the row, so transform one row and one column and broadcast.
+    centre = np.full_like(pix, 0.5 * (side - 1))
+    ra_row, _ = wcs_grid.wcs_pix2world(pix, centre, 0)
+    _, dec_col = wcs_grid.wcs_pix2world(centre, pix, 0)
+    ra = np.repeat(ra_row[np.newaxis, :], side, axis=0)
+    dec = np.repeat(dec_col[:, np.newaxis], side, axis=1)
     return ra, dec
 
 
@@ -182,10 +192,12 @@ def iram_plotpolvec(maps, wcs, plot_title, scale, figname, colormap="rainbow"):
         np.linspace(yy0, yy1, ny, endpoint=True),
     )
     mask = maps[0] < 0.02
-    a = position_angle_pol(maps[1], maps[2], deg=True)
-    p = np.sqrt(maps[1] ** 2 + maps[2] ** 2)
+    Q = np.asarray(maps[1], dtype=np.float32)
+    U = np.asarray(maps[2], dtype=np.float32)
+    a = position_angle_pol(Q, U, deg=True)
+    p = np.hypot(Q, U)
     p[mask] = 0
     a[mask] = 0
     dx, dy = posanglepol_to_xy(p, a, deg=True)
-    plot_reg_arrows((X, Y), (dx, dy), scale)
+    plot_reg_arrows((X, Y), (dx, dy), scale=scale)
     plt.savefig(figname, bbox_inches="tight")
@@ -3,15 +3,92 @@ Mapmaking script to make Stokes IQU binned maps from Planck TOD with
 pixel size of 1.5' and 80 pixels along one side.
 """
 
+import functools
 import os
+from concurrent.futures import ThreadPoolExecutor
 from pathlib import Path
 from typing import Optional, Sequence
 
 import healpy as hp
 import npipe_utils as utils
 import numpy as np
-from gettod import Get_TOD
-from scipy.linalg import pinv
+from astropy.io import fits
+from gettod import _DEFAULT_F_BG, _PLANCK_FREQ, Get_TOD
+
+# HEALPix maps observing at most this sky fraction are written as partial maps
+_PARTIAL_MAX_FSKY = 0.1
+# FITS binary-table formats of the map column dtypes
+_FITS_FORMAT = {"f4": "E", "f8": "D", "i4": "J", "i8": "K"}
+
+
+def _import_cupy():
+    try:
+        import cupy
+    except ImportError as err:
+        raise ImportError(
+            "GPU binning requires cupy. Install the cupy build matching your CUDA "
+            "version or use use_gpu=False."
+        ) from err
+    return cupy
+
+
+def _to_numpy(a):
+    """Return `a` as a NumPy array, copying it from the GPU if it is a CuPy array."""
+    return a.get() if hasattr(a, "get") else np.asarray(a)
+
+
+def _write_partial_map(path, nside, pixels, maps, nest=True):
+    """Write an explicit-index (partial-sky) HEALPix map from its observed pixels only.
+
+    `maps` holds one array per column, each aligned with `pixels`. The table follows
+    the layout of `hp.write_map(partial=True)`, so `hp.read_map` reads it back as a
+    full-sky map with UNSEEN in the unobserved pixels, but no full-sky array is needed.
+    """
+    names = hp.fitsfunc.standard_column_names.get(len(maps))
+    if isinstance(names, str):
+        names = [names]
+    elif names is None:
+        names = ["COLUMN{}".format(i) for i in range(1, len(maps) + 1)]
+    pixfmt = "J" if 12 * nside**2 <= np.iinfo(np.int32).max else "K"
+    cols = [fits.Column(name="PIXEL", format=pixfmt, array=pixels)]
+    for name, m in zip(names, maps):
+        cols.append(
+            fits.Column(name=name, format=_FITS_FORMAT[m.dtype.str[1:]], array=m)
+        )
+    hdu = fits.BinTableHDU.from_columns(cols)
+    hdu.header["PIXTYPE"] = ("HEALPIX", "HEALPIX pixelisation")
+    hdu.header["ORDERING"] = (
+        "NESTED" if nest else "RING",
+        "Pixel ordering scheme, either RING or NESTED",
+    )
+    hdu.header["EXTNAME"] = ("xtension", "name of this binary table extension")
+    hdu.header["NSIDE"] = (nside, "Resolution parameter of HEALPIX")
+    hdu.header["INDXSCHM"] = ("EXPLICIT", "Indexing: IMPLICIT or EXPLICIT")
+    hdu.header["OBJECT"] = ("PARTIAL", "Sky coverage, either FULLSKY or PARTIAL")
+    fits.HDUList([fits.PrimaryHDU(), hdu]).writeto(path, overwrite=True)
+
+
+def _solve_normal_equations(PTP, rhs, rtol=1e-10, xp=np):
+    """Solve a stack of symmetric (n, 3, 3) normal-equation systems PTP x = rhs.
+
+    Well-conditioned systems go through one batched direct solve. Systems whose
+    Hadamard ratio det(PTP) / prod(diag(PTP)) is below `rtol` (degenerate pointing
+    weights, e.g. a single polarisation angle in the cell) fall back to the
+    pseudo-inverse. `xp` is the array module of the inputs (numpy or cupy); the
+    few degenerate systems are always pseudo-inverted on the CPU.
+    """
+    diag = xp.prod(xp.diagonal(PTP, axis1=1, axis2=2), axis=1)
+    good = xp.linalg.det(PTP) > rtol * diag
+    x = xp.empty(rhs.shape)
+    x[good] = xp.linalg.solve(PTP[good], rhs[good][..., None])[..., 0]
+    if not good.all():
+        bad = ~good
+        x_bad = (
+            np.linalg.pinv(_to_numpy(PTP[bad]), hermitian=True)
+            @ _to_numpy(rhs[bad])[..., None]
+        )[..., 0]
+        x[bad] = xp.asarray(x_bad)
+    return x
 
 
 class MapMaker:
@@ -30,6 +107,8 @@ class MapMaker:
         pixel_size: float = 1.5,  # in arcminutes
         split: Optional[str] = None,
         tod_loader: Optional[Get_TOD] = None,
+        maps_dir: Optional[str] = None,
+        use_gpu: bool = False,
     ) -> None:
         self.data_path = data_path
         self.alpha = alpha
@@ -43,7 +122,9 @@ class MapMaker:
         self.npix = npix
         self.split = split
         self.pixel_size = pixel_size  # in arcminutes
-        self.planck_freq = {"LFI": [30, 40, 70], "HFI": [100, 143, 217, 353, 545, 857]}
+        self.planck_freq = _PLANCK_FREQ
+        # Array module for the binning: cupy runs it on the GPU, numpy on the CPU
+        self.xp = _import_cupy() if use_gpu else np
         if self.data_path is None:
             self.data_path = utils.get_data_path(subfolder="data/")
         if coord is None and coord_system == "galactic":
@@ -51,18 +132,11 @@ class MapMaker:
         elif coord is None and coord_system == "equatorial":
             coord = [83.63304, 22.01449]  # equatorial coord of tau-A
         if self.bg_subtraction and self.f_bg is None:
-            if instrument == "LFI":
-                f_bg = np.array(
-                    [1.70065975e-03, 1.54363888e-03, 2.03856413e-04]
-                )  # in K_CMB units
-            elif instrument == "HFI":
-                f_bg = np.array(
-                    [9.50687754e-5, 1.89320788e-4, 6.29073416e-4, 6.16040430e-3]
-                )  # in K_CMB units
+            self.f_bg = _DEFAULT_F_BG[instrument]
             print(
                 "Background flux for background subtraction not provided. Using default values of"
                 "{} in K_CMB units for frequencies {}".format(
-                    f_bg, self.planck_freq[instrument]
+                    self.f_bg, self.planck_freq[instrument]
                 )
             )
         if withcc:
@@ -74,6 +148,13 @@ class MapMaker:
         # Validate data path
         self._validate_data_path()
 
+        # Output folder for binned maps: ./maps by default, resolved once here and
+        # created when the first map is written
+        if maps_dir is None:
+            self._maps_dir = Path.cwd() / "maps"
+        else:
+            self._maps_dir = Path(maps_dir)
+
         # TOD loader: accept an injected loader or create one from same args
         if tod_loader is not None:
             self.tod_loader = tod_loader
@@ -97,16 +178,32 @@ class MapMaker:
                 f"The specified data path {self.data_path} does not exist."
             )
 
+    def _map_path(self, mapname):
+        """Return the output path of a map file, creating the maps folder if needed."""
+        self._maps_dir.mkdir(parents=True, exist_ok=True)
+        return self._maps_dir / mapname
+
+    @staticmethod
+    @functools.lru_cache(maxsize=256)
+    def _map_filename(freq, size, split, kind):
+        """Return the output filename of a binned map.
+
+        `kind` is "grid" (`size` is the number of pixels per side) or "healpix"
+        (`size` is nside). Cached, as sweeps over frequencies and splits request
+        the same few names repeatedly.
+        """
+        if kind == "grid":
+            if split is not None:
+                return "{}GHz_{}pix_{}_grid.fits".format(freq, size, split)
+            return "{}GHz_{}pix_grid.fits".format(freq, size)
+        if kind == "healpix":
+            if split is not None:
+                return "{}GHz_{}hpbinning_{}.fits".format(freq, size, split)
+            return "{}GHz_{}hpbinning.fits".format(freq, size)
+        raise ValueError("Unknown map kind {}".format(kind))
+
     def _bin_tod_ongrid(self, freq, npix, pixel_size, split=None, instrument="HFI"):
-        if os.path.exists(Path(__name__).resolve().parent / "maps"):
-            path = Path(__name__).resolve().parent / "maps/"
-        else:
-            os.makedirs(Path(__name__).resolve().parent / "maps", exist_ok=True)
-            path = Path(__name__).resolve().parent / "maps/"
-        if split is not None:
-            mapname = "{}GHz_{}pix_{}_grid.fits".format(freq, npix, split)
-        else:
-            mapname = "{}GHz_{}pix_grid.fits".format(freq, npix)
+        mapname = self._map_filename(freq, npix, split, "grid")
 
         # Get TOD & coordinates on a grid using injected TOD loader
         print("Extracting TOD for {}GHz freq channel".format(freq))
@@ -119,54 +216,153 @@ class MapMaker:
             split=split,
         )
         print("Making map for {}GHz freq channel".format(freq))
+        xp = self.xp
+        x, y, xbinning, ybinning, signal = map(
+            xp.asarray, (x, y, xbinning, ybinning, signal)
+        )
+        # (3, nsamp) C-order so each Stokes weight row is a unit-stride array
+        pixweights = xp.ascontiguousarray(xp.asarray(pixweights))
+
+        # Assign every sample to its grid cell in one pass; samples outside the grid are dropped.
+        # Cells are numbered row-major as (y bin, x bin) to match the bmap[j, i] layout.
+        ncells = npix * npix
+        ix = xp.searchsorted(xbinning, x) - 1
+        iy = xp.searchsorted(ybinning, y) - 1
+        inside = (ix >= 0) & (ix < npix) & (iy >= 0) & (iy < npix)
+        cell = (iy * npix + ix)[inside]
+        weights = pixweights[:, inside]
+        sig = signal[inside]
 
-        bmap = np.zeros((npix, npix, 3))
-        for i in np.arange(npix):
-            m = np.logical_and(x > xbinning[i], x < xbinning[i + 1])
-            yx = y * m
-            for j in np.arange(npix):
-                m = np.logical_and(np.abs(yx) > ybinning[j], yx < ybinning[j + 1])
-                PTP = pixweights[:, m] @ pixweights[:, m].T
-                mp = pinv(PTP) @ pixweights[:, m] @ signal[m]
-                bmap[j, i] = mp
+        # Accumulate the per-cell normal equations PTP m = P^T d. PTP is symmetric, so
+        # only its six upper-triangle entries are binned and mirrored into the lower one.
+        PTP = xp.empty((ncells, 3, 3))
+        for k, m in zip(*np.triu_indices(3)):
+            PTP[:, k, m] = xp.bincount(
+                cell, weights=weights[k] * weights[m], minlength=ncells
+            )
+            PTP[:, m, k] = PTP[:, k, m]
+        rhs = xp.stack(
+            [
+                xp.bincount(cell, weights=sig * weights[k], minlength=ncells)
+                for k in range(3)
+            ],
+            axis=-1,
+        )
+        # IQU needs at least three samples; cells with fewer hits are left at zero
+        hits = xp.bincount(cell, minlength=ncells)
+        solvable = hits >= 3
+        mp = xp.zeros((ncells, 3))
+        mp[solvable] = _solve_normal_equations(PTP[solvable], rhs[solvable], xp=xp)
+        bmap = _to_numpy(mp).reshape(npix, npix, 3)
 
         print("Made map for {}GHz freq channel. Writing map to file..".format(freq))
-        utils.create_fits(path + mapname, bmap.T)
-        print("Written map to file {}".format(path + mapname))
+        outpath = self._map_path(mapname)
+        utils.create_fits(str(outpath), bmap.T)
+        print("Written map to file {}".format(outpath))
         return bmap
 
-    def _bin_tod_healpix(self, freq, nside, nnz=3, instrument="HFI", split=None):
-        if os.path.exists(Path(__name__).resolve().parent / "maps"):
-            path = Path(__name__).resolve().parent / "maps/"
-        else:
-            os.makedirs(Path(__name__).resolve().parent / "maps", exist_ok=True)
-            path = Path(__name__).resolve().parent / "maps/"
-        if split is not None:
-            mapname = "{}GHz_{}hpbinning_{}.fits".format(freq, nside, split)
-        else:
-            mapname = "{}GHz_{}hpbinning.fits".format(freq, nside)
+    def _bin_tod_healpix(
+        self, freq, nside, nnz=3, instrument="HFI", split=None, partial=None
+    ):
+        """Bin the TOD of one frequency channel into a HEALPix IQU map and write it.
+
+        `partial` selects the output format: True writes explicit-index partial maps
+        holding only the observed pixels (unobserved pixels read back as UNSEEN),
+        False writes full-sky maps (unobserved pixels are 0). By default, maps that
+        observe at most 10% of the sky are written as partial maps. Partial maps are
+        written from the per-pixel arrays, without full-sky copies; maps with no
+        observed pixels are always written full-sky. The hits map is int32 in both
+        formats. The returned map is always full-sky, with 0 in unobserved pixels.
+        """
+        mapname = self._map_filename(freq, nside, split, "healpix")
 
         # Get TOD & coordinates using injected TOD loader
         print("Extracting TOD for {}GHz freq channel".format(freq))
         tod = self.tod_loader.tod(freq=freq, nside=nside, split=split)
         signal, pixels, pixweights = tod.signal, tod.pixels, tod.weights
+        # Binning is memory-bound, so the TOD and the maps are kept in float32 (the
+        # precision Planck maps are distributed in); bincount still sums in float64.
+        # `TOD` pins these dtypes, with the weights as C-order (nnz, nsamp) rows.
+        if signal.dtype != np.float32 or pixweights.dtype != np.float32:
+            raise TypeError("TOD signal and weights must be float32")
+        if pixels.dtype != np.int64:
+            raise TypeError("TOD pixels must be int64")
         print("Making map for {}GHz freq channel".format(freq))
+        xp = self.xp
+        signal, pixels, pixweights = map(xp.asarray, (signal, pixels, pixweights))
 
-        isamp = 0
-        imap = 0  # IQU
-        bmap = np.zeros((12 * nside**2, nnz))  # binned map
-        nmap = np.zeros((12 * nside**2, nnz))  # hits map
-        nsamp = signal.shape[0]
-        for isamp in range(nsamp):
-            pix = pixels[isamp]
-            if pix < 0:
-                continue
-            for imap in range(nnz):
-                bmap[pix, imap] += signal[isamp] * pixweights.T[isamp, imap]
-                nmap[pix, imap] += 1
+        npix_map = 12 * nside**2
+        valid = pixels >= 0
+        pix_v = pixels[valid]
+        sig_v = signal[valid]
+        if pix_v.size < npix_map // 8:
+            # Sparse coverage (e.g. a small field at high nside): group the samples by
+            # pixel with one sort and bin into the observed pixels only, instead of
+            # running full-sky bincount passes.
+            obs_pix, pix_idx = xp.unique(pix_v, return_inverse=True)
+            nbins = obs_pix.size
+        else:
+            obs_pix, pix_idx, nbins = None, pix_v, npix_map
+        # binned IQU values and hit counts of the nbins binned pixels; the hit count
+        # is identical for every Stokes component
+        vals = xp.empty((nbins, nnz), dtype=np.float32)
+        for imap in range(nnz):  # IQU
+            vals[:, imap] = xp.bincount(
+                pix_idx, weights=sig_v * pixweights[imap, valid], minlength=nbins
+            )
+        counts = xp.bincount(pix_idx, minlength=nbins).astype(np.int32)
+        # one transfer back to the host for the FITS writes and the returned map
+        vals, counts = _to_numpy(vals), _to_numpy(counts)
+        if obs_pix is None:
+            bmap = vals  # binned map, already full-sky
+            obs_pix = np.flatnonzero(counts)
+        else:
+            obs_pix = _to_numpy(obs_pix)
+            bmap = np.zeros((npix_map, nnz), dtype=np.float32)  # binned map
+            bmap[obs_pix] = vals
 
         print("Made map for {}GHz freq channel. Writing map to file..".format(freq))
-        hp.write_map(path + mapname, bmap.T, nest=True, overwrite=True)
-        hp.write_map(path + "hits_" + mapname, nmap.T, nest=True, overwrite=True)
-        print("Written map to file {}".format(path + mapname))
+        outpath = self._map_path(mapname)
+        hitspath = self._map_path("hits_" + mapname)
+        if partial is None:
+            partial = obs_pix.size <= _PARTIAL_MAX_FSKY * npix_map
+        if partial and obs_pix.size > 0:
+            # write the observed pixels only, straight from the per-pixel arrays
+            if vals.shape[0] == npix_map:
+                vals, counts = vals[obs_pix], counts[obs_pix]
+            _write_partial_map(str(outpath), nside, obs_pix, list(vals.T))
+            _write_partial_map(str(hitspath), nside, obs_pix, [counts] * nnz)
+        else:
+            if counts.shape[0] != npix_map:
+                hits = np.zeros(npix_map, dtype=np.int32)
+                hits[obs_pix] = counts
+                counts = hits
+            hp.write_map(str(outpath), bmap.T, nest=True, overwrite=True)
+            hp.write_map(str(hitspath), [counts] * nnz, nest=True, overwrite=True)
+        print("Written map to file {}".format(outpath))
         return bmap
+
+    def make_all_maps(
+        self,
+        freqs: Optional[Sequence[int]] = None,
+        nside: Optional[int] = None,
+        max_workers: Optional[int] = None,
+    ):
+        """Bin HEALPix maps for several frequency channels concurrently.
+
+        Each frequency is an independent `_bin_tod_healpix` call on its own TOD, run on a
+        thread pool, overlapping the TOD reads and the parts of the binning that release the GIL.
+        Defaults to all channels of `self.instrument` at `self.nside`. Peak memory grows with
+        the number of workers, so lower `max_workers` for high nside.
+
+        Returns the binned maps in the order of `freqs`.
+        """
+        freqs = freqs or self.planck_freq[self.instrument]
+        nside = nside or self.nside
+        with ThreadPoolExecutor(max_workers=max_workers or len(freqs)) as ex:
+            return list(
+                ex.map(
+                    lambda freq: self._bin_tod_healpix(freq, nside, split=self.split),
+                    freqs,
+                )
+            )
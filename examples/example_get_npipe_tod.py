@@ -1,11 +1,10 @@
-import sys
 import os
+import sys
 
-# make the tau-A sources importable (adjust if running from repo root)
-sys.path.append(
-    os.path.join(os.path.dirname(__file__).removesuffix("/examples"), "/crabpol")
-)
-from ..crabpol.gettod import Get_TOD, GetTODConfig
+# make the crabpol modules importable when running this script directly
+sys.path.insert(0, os.path.join(os.path.dirname(__file__), "..", "crabpol"))
+
+from gettod import Get_TOD, GetTODConfig
 
 # FIX: #1) Configure (replace data_path with your local data folder)
 cfg = GetTODConfig(
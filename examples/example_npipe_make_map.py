@@ -1,15 +1,14 @@
 """Example script to make a binned map in HEALPix pixelization scheme
 from destriped NPIPE TOD using MapMaker."""
 
-import sys
 import os
+import sys
 
-sys.path.append(
-    os.path.join(os.path.dirname(__file__).removesuffix("/examples"), "/tau-A")
-)
+# make the crabpol modules importable when running this script directly
+sys.path.insert(0, os.path.join(os.path.dirname(__file__), "..", "crabpol"))
 
-from ..crabpol.gettod import Get_TOD, GetTODConfig
-from ..crabpol.mapmaker import MapMaker
+from gettod import Get_TOD, GetTODConfig
+from mapmaker import MapMaker
 
 # Fix: 1) Configure (replace with your actual data path containing M1/ and PR2-3/)
 cfg = GetTODConfig(
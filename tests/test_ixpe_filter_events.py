@@ -0,0 +1,201 @@
+"""Unit tests for `FilterEvents`.
+
+These tests write small synthetic IXPE event and CalDB response files
+to a temporary directory, so they run without real IXPE data.
+"""
+
+import os
+import sys
+
+import numpy as np
+import pytest
+from astropy.io import fits
+
+# Add parent directory to path to import ixpe_filter_events
+sys.path.insert(0, os.path.join(os.path.dirname(__file__), "..", "crabpol"))
+
+import ixpe_instrument as instrument
+from ixpe_filter_events import FilterEvents
+
+NCHAN = 40
+
+
+@pytest.fixture(autouse=True)
+def clear_response_caches():
+    for loader in (instrument._load_rmf, instrument._load_arf, instrument._load_modf):
+        loader.cache_clear()
+    yield
+
+
+def write_response_files(
+    resp_path, detector="d1", caldb="20170101", recon="alpha075_02"
+):
+    cpf = os.path.join(resp_path, "data", "ixpe", "gpd", "cpf")
+    for sub in ("rmf", "arf", "modfact"):
+        os.makedirs(os.path.join(cpf, sub))
+    edges = 0.25 * np.arange(NCHAN + 1)
+    rmf = fits.BinTableHDU.from_columns(
+        [
+            fits.Column(name="CHANNEL", array=np.arange(NCHAN), format="J"),
+            fits.Column(name="E_MIN", array=edges[:-1], format="E"),
+            fits.Column(name="E_MAX", array=edges[1:], format="E"),
+        ]
+    )
+    fits.HDUList([fits.PrimaryHDU(), fits.BinTableHDU(), rmf]).writeto(
+        os.path.join(cpf, "rmf", "ixpe_{}_{}_{}.rmf".format(detector, caldb, recon))
+    )
+    for sub, name, resp in (
+        ("arf", "ixpe_{}_{}_{}.arf", 100.0 + np.arange(NCHAN)),
+        ("modfact", "ixpe_{}_{}_mfact_{}.fits", 0.01 * np.arange(NCHAN)),
+    ):
+        arf = fits.BinTableHDU.from_columns(
+            [
+                fits.Column(name="ENERG_LO", array=edges[:-1], format="E"),
+                fits.Column(name="ENERG_HI", array=edges[1:], format="E"),
+                fits.Column(name="SPECRESP", array=resp, format="E"),
+            ]
+        )
+        fits.HDUList([fits.PrimaryHDU(), arf]).writeto(
+            os.path.join(cpf, sub, name.format(detector, caldb, recon))
+        )
+
+
+def write_events_file(path, n=200, seed=0):
+    rng = np.random.default_rng(seed)
+    cols = {
+        "PI": (rng.integers(0, NCHAN, n), "J"),
+        "Q": (rng.uniform(-1, 1, n), "D"),
+        "U": (rng.uniform(-1, 1, n), "D"),
+        "X": (rng.uniform(0, 600, n), "E"),
+        "Y": (rng.uniform(0, 600, n), "E"),
+        "W_MOM": (rng.uniform(0, 1, n), "E"),
+    }
+    hdu = fits.BinTableHDU.from_columns(
+        [fits.Column(name=k, array=a, format=f) for k, (a, f) in cols.items()]
+    )
+    hdu.writeto(path)
+    return {k: a for k, (a, _) in cols.items()}
+
+
+def test_filter_events(tmp_path):
+    resp_path = str(tmp_path / "caldb")
+    write_response_files(resp_path)
+    events = write_events_file(str(tmp_path / "events.fits"))
+
+    fe = FilterEvents(
+        str(tmp_path / "events.fits"),
+        resp_path,
+        str(tmp_path),
+        min_energy=2.0,
+        max_energy=8.0,
+    )
+    fe.filter_events()
+
+    energy = 0.25 * events["PI"] + 0.125
+    keep = (energy >= 2.0) & (energy <= 8.0)
+    with fits.open(str(tmp_path / "filtered_d1_alpha075_02.fits")) as hdul:
+        out = hdul[1].data
+        assert len(out) == keep.sum()
+        assert np.array_equal(out["PI"], events["PI"][keep])
+        assert np.allclose(out["E"], energy[keep])
+        assert np.allclose(out["Q"], events["Q"][keep])
+        assert np.allclose(out["U"], events["U"][keep])
+        assert np.allclose(out["X"], events["X"][keep])
+        assert np.allclose(out["W_MOM"], events["W_MOM"][keep])
+        assert np.allclose(out["Aeff"], 100.0 + events["PI"][keep])
+        assert np.allclose(out["Modf"], 0.01 * events["PI"][keep])
+
+
+def test_filter_events_parquet(tmp_path):
+    pq = pytest.importorskip("pyarrow.parquet")
+    resp_path = str(tmp_path / "caldb")
+    write_response_files(resp_path)
+    events = write_events_file(str(tmp_path / "events.fits"))
+
+    FilterEvents(
+        str(tmp_path / "events.fits"),
+        resp_path,
+        str(tmp_path),
+        output_format="parquet",
+    ).filter_events()
+
+    energy = 0.25 * events["PI"] + 0.125
+    keep = (energy >= 2.0) & (energy <= 8.0)
+    table = pq.read_table(str(tmp_path / "filtered_d1_alpha075_02.parquet"))
+    assert table.column_names == [
+        "PI",
+        "E",
+        "X",
+        "Y",
+        "Q",
+        "U",
+        "W_MOM",
+        "Aeff",
+        "Modf",
+    ]
+    assert np.array_equal(table["PI"].to_numpy(), events["PI"][keep])
+    assert np.allclose(table["Q"].to_numpy(), events["Q"][keep])
+
+
+def test_invalid_output_format():
+    with pytest.raises(ValueError):
+        FilterEvents("events.fits", "caldb", ".", output_format="csv")
+
+
+def test_parquet_output_requires_pyarrow(monkeypatch):
+    monkeypatch.setitem(sys.modules, "pyarrow", None)
+    with pytest.raises(ImportError, match="pyarrow"):
+        FilterEvents("events.fits", "caldb", ".", output_format="parquet")
+
+
+def test_filter_events_skips_up_to_date_output(tmp_path, monkeypatch):
+    resp_path = str(tmp_path / "caldb")
+    write_response_files(resp_path)
+    write_events_file(str(tmp_path / "events.fits"))
+    out_path = str(tmp_path / "filtered_d1_alpha075_02.fits")
+
+    FilterEvents(
+        str(tmp_path / "events.fits"), resp_path, str(tmp_path)
+    ).filter_events()
+    with fits.open(out_path, checksum=True) as hdul:
+        assert hdul[1].header["FILTKEY"]
+
+    def fail(*args, **kwargs):
+        raise AssertionError("events were re-filtered")
+
+    monkeypatch.setattr(instrument, "chan_to_e", fail)
+    FilterEvents(
+        str(tmp_path / "events.fits"), resp_path, str(tmp_path)
+    ).filter_events()
+
+    # a different energy cut invalidates the stored fingerprint
+    monkeypatch.undo()
+    FilterEvents(
+        str(tmp_path / "events.fits"), resp_path, str(tmp_path), min_energy=3.0
+    ).filter_events()
+    with fits.open(out_path) as hdul:
+        assert hdul[1].data["E"].min() >= 3.0
+
+    # so does a different CalDB tree with the same version strings
+    other_resp = str(tmp_path / "caldb2")
+    write_response_files(other_resp)
+    monkeypatch.setattr(instrument, "chan_to_e", fail)
+    with pytest.raises(AssertionError, match="re-filtered"):
+        FilterEvents(
+            str(tmp_path / "events.fits"), other_resp, str(tmp_path), min_energy=3.0
+        ).filter_events()
+
+
+def test_filter_events_refilters_truncated_parquet(tmp_path):
+    pytest.importorskip("pyarrow")
+    resp_path = str(tmp_path / "caldb")
+    write_response_files(resp_path)
+    write_events_file(str(tmp_path / "events.fits"))
+    out_path = tmp_path / "filtered_d1_alpha075_02.parquet"
+    out_path.write_bytes(b"PAR1 truncated")
+
+    FilterEvents(
+        str(tmp_path / "events.fits"), resp_path, str(tmp_path), output_format="parquet"
+    ).filter_events()
+
+    assert out_path.stat().st_size > 100
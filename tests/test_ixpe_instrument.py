@@ -0,0 +1,141 @@
+"""Unit tests for the `ixpe_instrument` response lookups.
+
+These tests mock out the CalDB FITS reads so they run as lightweight
+unit tests without IXPE response files.
+"""
+
+import os
+import sys
+from types import SimpleNamespace
+
+import numpy as np
+import pytest
+
+# Add parent directory to path to import ixpe_instrument
+sys.path.insert(0, os.path.join(os.path.dirname(__file__), "..", "crabpol"))
+
+import ixpe_instrument as instrument
+
+
+@pytest.fixture(autouse=True)
+def clear_response_caches():
+    for loader in (instrument._load_rmf, instrument._load_arf, instrument._load_modf):
+        loader.cache_clear()
+    yield
+
+
+class DummyHDUList:
+    def __init__(self, hdus):
+        self._hdus = hdus
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, exc_type, exc, tb):
+        return False
+
+    def __getitem__(self, idx):
+        return self._hdus[idx]
+
+    def close(self):
+        pass
+
+
+def make_rmf(nchan=10, first_chan=0):
+    dtype = [("CHANNEL", np.int16), ("E_MIN", np.float32), ("E_MAX", np.float32)]
+    arr = np.zeros(nchan, dtype=dtype)
+    arr["CHANNEL"] = first_chan + np.arange(nchan)
+    arr["E_MIN"] = 0.5 * np.arange(nchan)
+    arr["E_MAX"] = 0.5 * np.arange(1, nchan + 1)
+    return DummyHDUList([None, None, SimpleNamespace(data=arr)])
+
+
+def make_arf(nbins=10):
+    dtype = [
+        ("ENERG_LO", np.float32),
+        ("ENERG_HI", np.float32),
+        ("SPECRESP", np.float32),
+    ]
+    arr = np.zeros(nbins, dtype=dtype)
+    arr["ENERG_LO"] = 0.5 * np.arange(nbins)
+    arr["ENERG_HI"] = 0.5 * np.arange(1, nbins + 1)
+    arr["SPECRESP"] = 10.0 + np.arange(nbins)
+    return DummyHDUList([None, SimpleNamespace(data=arr)])
+
+
+def test_chan_to_e(monkeypatch):
+    monkeypatch.setattr(instrument.fits, "open", lambda path, **kw: make_rmf())
+
+    es = instrument.chan_to_e(np.array([0, 3, 9, 3]), resp_path="")
+    assert isinstance(es, np.ndarray)
+    assert es.shape == (4,)
+    assert np.allclose(es, [0.25, 1.75, 4.75, 1.75])
+
+    assert np.isclose(instrument.chan_to_e(2, resp_path=""), 1.25)
+
+
+def test_chan_to_e_non_dense_channels(monkeypatch):
+    monkeypatch.setattr(
+        instrument.fits, "open", lambda path, **kw: make_rmf(first_chan=1)
+    )
+
+    es = instrument.chan_to_e(np.array([1, 4, 10]), resp_path="")
+    assert np.allclose(es, [0.25, 1.75, 4.75])
+
+
+def test_chan_to_e_unknown_channels(monkeypatch):
+    monkeypatch.setattr(instrument.fits, "open", lambda path, **kw: make_rmf())
+    for channel in (-1, 10, np.array([0, 3, 12])):
+        with pytest.raises(ValueError):
+            instrument.chan_to_e(channel, resp_path="")
+
+    instrument._load_rmf.cache_clear()
+    monkeypatch.setattr(
+        instrument.fits, "open", lambda path, **kw: make_rmf(first_chan=1)
+    )
+    for channel in (0, 500, np.array([1, 4, 7, 11])):
+        with pytest.raises(ValueError):
+            instrument.chan_to_e(channel, resp_path="")
+
+
+def test_lookups_with_unsorted_grids(monkeypatch):
+    rmf = make_rmf()
+    rmf[2].data = rmf[2].data[::-1].copy()
+    monkeypatch.setattr(instrument.fits, "open", lambda path, **kw: rmf)
+    assert np.allclose(
+        instrument.chan_to_e(np.array([0, 3, 9]), resp_path=""), [0.25, 1.75, 4.75]
+    )
+
+    arf = make_arf()
+    arf[1].data = arf[1].data[[3, 0, 9, 1, 2, 8, 4, 7, 5, 6]]
+    monkeypatch.setattr(instrument.fits, "open", lambda path, **kw: arf)
+    assert np.allclose(
+        instrument.e_to_aeff(np.array([0.25, 1.3, 4.9]), resp_path=""),
+        [10.0, 12.0, 19.0],
+    )
+
+
+def test_e_to_aeff_and_modf(monkeypatch):
+    monkeypatch.setattr(instrument.fits, "open", lambda path, **kw: make_arf())
+
+    # energies inside bins, on a lower edge, and beyond the tabulated range
+    energy = np.array([0.25, 1.0, 1.3, 4.9, 7.0])
+    expected = [10.0, 12.0, 12.0, 19.0, 19.0]
+    assert np.allclose(instrument.e_to_aeff(energy, resp_path=""), expected)
+    assert np.allclose(instrument.e_to_modf(energy, resp_path=""), expected)
+
+
+def test_response_files_opened_once(monkeypatch):
+    opened = []
+
+    def fake_open(path, **kw):
+        opened.append(path)
+        return make_rmf()
+
+    monkeypatch.setattr(instrument.fits, "open", fake_open)
+
+    for _ in range(3):
+        instrument.chan_to_e(np.arange(5), resp_path="/caldb", detector="d2")
+    assert opened == [
+        os.path.join("/caldb", "data/ixpe/gpd/cpf/rmf/ixpe_d2_20170101_alpha075_02.rmf")
+    ]
@@ -0,0 +1,248 @@
+"""Unit tests for the `MapMaker` binning routines.
+
+These tests inject a fake TOD loader with synthetic TOD, so they run
+without Planck data files, and compare the binned maps against
+straightforward per-sample / per-cell reference loops.
+"""
+
+import os
+import sys
+from types import SimpleNamespace
+
+import numpy as np
+import pytest
+
+# Add parent directory to path to import mapmaker
+sys.path.insert(0, os.path.join(os.path.dirname(__file__), "..", "crabpol"))
+
+import healpy as hp
+from astropy.io import fits
+from gettod import TOD
+from mapmaker import MapMaker, _solve_normal_equations
+
+
+class FakeTODLoader:
+    def __init__(self, nsamp=3000, npix=10, nside=4, seed=0):
+        rng = np.random.default_rng(seed)
+        self.signal = rng.normal(size=nsamp)
+        self.pixels = rng.integers(-1, 12 * nside**2, nsamp)
+        self.weights = np.vstack(
+            [np.ones(nsamp), rng.normal(size=nsamp), rng.normal(size=nsamp)]
+        )
+        self.x = rng.uniform(-1.0, npix + 1.0, nsamp)
+        self.y = rng.uniform(-1.0, npix + 1.0, nsamp)
+        self.binning = np.linspace(0, npix, npix + 1)
+
+    def tod(self, freq=None, nside=None, split=None):
+        return TOD(signal=self.signal, pixels=self.pixels, weights=self.weights)
+
+    def tod_ongrid(self, coord=None, freq=None, npix=80, pixsize=1.5, **kwargs):
+        return (
+            self.x,
+            self.y,
+            self.binning,
+            self.binning,
+            self.signal,
+            self.weights,
+        )
+
+
+def make_mapmaker(tmp_path, loader):
+    return MapMaker(
+        data_path=str(tmp_path), tod_loader=loader, maps_dir=str(tmp_path / "maps")
+    )
+
+
+def test_bin_tod_healpix(tmp_path):
+    nside = 4
+    loader = FakeTODLoader(nside=nside)
+    mm = make_mapmaker(tmp_path, loader)
+
+    bmap = mm._bin_tod_healpix(freq=100, nside=nside)
+
+    expected = np.zeros((12 * nside**2, 3))
+    hits = np.zeros(12 * nside**2)
+    for isamp, pix in enumerate(loader.pixels):
+        if pix < 0:
+            continue
+        expected[pix] += loader.signal[isamp] * loader.weights[:, isamp]
+        hits[pix] += 1
+    assert bmap.dtype == np.float32
+    assert np.allclose(bmap, expected)
+
+    written = hp.read_map(
+        str(tmp_path / "maps" / "100GHz_4hpbinning.fits"), field=None, nest=True
+    )
+    assert np.allclose(written.T, expected)
+    written_hits = hp.read_map(
+        str(tmp_path / "maps" / "hits_100GHz_4hpbinning.fits"), field=None, nest=True
+    )
+    assert np.allclose(written_hits[0], hits)
+
+
+def test_bin_tod_healpix_sparse_coverage(tmp_path):
+    nside = 64
+    loader = FakeTODLoader(nside=nside)
+    loader.pixels = 40000 + loader.pixels % 50  # a small observed patch
+    mm = make_mapmaker(tmp_path, loader)
+
+    bmap = mm._bin_tod_healpix(freq=100, nside=nside)
+
+    expected = np.zeros((12 * nside**2, 3))
+    np.add.at(expected, loader.pixels, loader.signal[:, None] * loader.weights.T)
+    assert np.allclose(bmap, expected)
+
+    # only the observed pixels are stored; the rest read back as UNSEEN
+    path = str(tmp_path / "maps" / "100GHz_64hpbinning.fits")
+    with fits.open(path) as hdul:
+        assert hdul[1].header["INDXSCHM"] == "EXPLICIT"
+        assert hdul[1].header["OBJECT"] == "PARTIAL"
+        assert len(hdul[1].data) == 50
+    written = hp.read_map(path, field=None, nest=True)
+    patch = slice(40000, 40050)
+    assert np.allclose(written[:, patch].T, expected[patch])
+    assert np.sum(written[0] == hp.UNSEEN) == 12 * nside**2 - 50
+    hits = hp.read_map(
+        str(tmp_path / "maps" / "hits_100GHz_64hpbinning.fits"), field=0, nest=True
+    )
+    assert np.array_equal(hits[patch], np.bincount(loader.pixels - 40000))
+
+
+def test_bin_tod_healpix_output_format_follows_coverage(tmp_path):
+    # many samples on few pixels: dense binning path, but partial output
+    loader = FakeTODLoader(nside=4)
+    loader.pixels = 150 + loader.pixels % 5
+    mm = make_mapmaker(tmp_path, loader)
+    path = tmp_path / "maps" / "100GHz_4hpbinning.fits"
+    hitspath = tmp_path / "maps" / "hits_100GHz_4hpbinning.fits"
+
+    mm._bin_tod_healpix(freq=100, nside=4)
+    with fits.open(str(path)) as hdul:
+        assert hdul[1].header["INDXSCHM"] == "EXPLICIT"
+    with fits.open(str(hitspath)) as hdul:
+        assert hdul[1].data.dtype[1].base == np.dtype(">i4")
+
+    bmap = mm._bin_tod_healpix(freq=100, nside=4, partial=False)
+    with fits.open(str(path)) as hdul:
+        assert hdul[1].header["INDXSCHM"] == "IMPLICIT"
+    with fits.open(str(hitspath)) as hdul:
+        assert hdul[1].data.dtype[0].base == np.dtype(">i4")
+    assert np.allclose(hp.read_map(str(path), nest=True), bmap[:, 0])
+
+
+def test_bin_tod_healpix_no_valid_samples(tmp_path):
+    loader = FakeTODLoader(nside=64)
+    loader.pixels = np.full_like(loader.pixels, -1)
+    mm = make_mapmaker(tmp_path, loader)
+
+    bmap = mm._bin_tod_healpix(freq=100, nside=64)
+
+    assert not bmap.any()
+    written = hp.read_map(
+        str(tmp_path / "maps" / "100GHz_64hpbinning.fits"), field=None, nest=True
+    )
+    assert not written.any()
+
+
+def test_make_all_maps(tmp_path):
+    loader = FakeTODLoader(nside=4)
+    mm = make_mapmaker(tmp_path, loader)
+
+    maps = mm.make_all_maps(freqs=[100, 143], nside=4)
+
+    assert len(maps) == 2
+    assert np.allclose(maps[0], mm._bin_tod_healpix(freq=100, nside=4))
+    for freq in (100, 143):
+        assert (tmp_path / "maps" / "{}GHz_4hpbinning.fits".format(freq)).exists()
+
+
+def test_bin_tod_ongrid(tmp_path):
+    npix = 10
+    loader = FakeTODLoader(npix=npix)
+    mm = make_mapmaker(tmp_path, loader)
+
+    bmap = mm._bin_tod_ongrid(freq=100, npix=npix, pixel_size=1.5)
+
+    x, y, edges = loader.x, loader.y, loader.binning
+    expected = np.zeros((npix, npix, 3))
+    for i in range(npix):
+        for j in range(npix):
+            m = (
+                (x > edges[i])
+                & (x <= edges[i + 1])
+                & (y > edges[j])
+                & (y <= edges[j + 1])
+            )
+            if m.sum() < 3:
+                continue
+            w = loader.weights[:, m]
+            expected[j, i] = np.linalg.solve(w @ w.T, w @ loader.signal[m])
+    assert np.allclose(bmap, expected)
+
+    with fits.open(str(tmp_path / "maps" / "100GHz_10pix_grid.fits")) as hdul:
+        assert np.allclose(hdul[0].data, expected.T, atol=1e-5)
+
+
+def test_solve_normal_equations_degenerate_cells():
+    rng = np.random.default_rng(1)
+    w = rng.normal(size=(4, 3, 20))
+    w[1, 2] = w[1, 1]  # Q and U weights identical: singular cell
+    w[3, 1:] = 0.0  # intensity-only cell
+    PTP = w @ w.transpose(0, 2, 1)
+    rhs = rng.normal(size=(4, 3))
+
+    x = _solve_normal_equations(PTP, rhs)
+
+    expected = (np.linalg.pinv(PTP, hermitian=True) @ rhs[..., np.newaxis])[..., 0]
+    assert np.allclose(x, expected)
+
+
+def test_bin_tod_healpix_rejects_unpinned_dtypes(tmp_path):
+    loader = FakeTODLoader()
+    loader.tod = lambda **kwargs: SimpleNamespace(
+        signal=loader.signal, pixels=loader.pixels, weights=loader.weights
+    )
+    mm = make_mapmaker(tmp_path, loader)
+    with pytest.raises(TypeError):
+        mm._bin_tod_healpix(freq=100, nside=4)
+
+
+def test_use_gpu_requires_cupy(tmp_path, monkeypatch):
+    monkeypatch.setitem(sys.modules, "cupy", None)
+    with pytest.raises(ImportError, match="cupy"):
+        MapMaker(
+            data_path=str(tmp_path),
+            tod_loader=FakeTODLoader(),
+            maps_dir=str(tmp_path / "maps"),
+            use_gpu=True,
+        )
+
+
+def test_default_f_bg_is_read_only(tmp_path):
+    mm = MapMaker(
+        data_path=str(tmp_path),
+        tod_loader=FakeTODLoader(),
+        maps_dir=str(tmp_path / "maps"),
+        bg_subtraction=True,
+    )
+    with pytest.raises(ValueError):
+        mm.f_bg[0] = 1.0
+
+
+def test_default_planck_freq_is_read_only(tmp_path):
+    mm = make_mapmaker(tmp_path, FakeTODLoader())
+    with pytest.raises(TypeError):
+        mm.planck_freq["HFI"] = (100,)
+    with pytest.raises(AttributeError):
+        mm.planck_freq["HFI"].append(1000)
+    assert make_mapmaker(tmp_path, FakeTODLoader()).planck_freq["HFI"][-1] == 857
+
+
+def test_maps_dir_defaults_to_cwd_and_is_created_on_write(tmp_path, monkeypatch):
+    monkeypatch.chdir(tmp_path)
+    mm = MapMaker(data_path=str(tmp_path), tod_loader=FakeTODLoader())
+    assert not (tmp_path / "maps").exists()
+
+    mm._bin_tod_healpix(freq=100, nside=4)
+
+    assert (tmp_path / "maps" / "100GHz_4hpbinning.fits").exists()